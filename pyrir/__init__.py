@@ -9,15 +9,16 @@ This program is designed with the hope that it will be useful, but WITHOUT ANY G
 import os
 import numpy as np
 from scipy.io import wavfile
+from scipy.signal import resample_poly
 from .microphone import Omni, Cardioid, Dipole, Hypercardioid, Subcardioid, Microphone
 from .speaker import Speaker
 from .room import ReflectRoom, ReverbRoom
-from .cyrir import rir
+from .cyrir import rir, rir_bformat
 
 
 __all__ = [
     'Omni', 'Cardioid', 'Dipole', 'Hypercardioid', 'Subcardioid',
-    'RIR', 'Field', 'Speaker', 'ReflectRoom', 'ReverbRoom'
+    'RIR', 'BFormatRIR', 'Field', 'Speaker', 'ReflectRoom', 'ReverbRoom'
     ] 
 
 
@@ -55,6 +56,11 @@ class RIR:
         self._rir_id += 1
         self._mic_names = channel_names
         self._spk_name = speaker_name
+        # RIR objects at other sampling rates, keyed by sampling rate
+        self._resampled = {}
+        # FFT size and RIR spectrum for the overlap-add convolution, computed on first use
+        self._nfft = None
+        self._spectrum = None
     
     def __str__(self):
         return self._name
@@ -65,27 +71,79 @@ class RIR:
         """
         return self._rir_array.copy()
     
-    def apply2audio1D(self, audio1d):
+    def get_fs(self):
+        return self._fs
+
+    def resample(self, fs):
+        """
+        Returns RIR object at the sampling rate fs, derived from this RIR by polyphase resampling
+            The resampled RIR objects are cached, each sampling rate is computed only once
+        Args:
+            fs: integer Sampling rate
+        """
+        if fs == self._fs:
+            return self
+        if fs not in self._resampled:
+            if fs <= 0 or int(fs) != fs:
+                raise ValueError('The Sampling Rate should be a positive integer.')
+            common = np.gcd(int(fs), int(self._fs))
+            up, down = int(fs) // common, int(self._fs) // common
+            # scaling by down / up keeps the frequency response of the RIR unchanged
+            rir_array = resample_poly(self._rir_array, up, down, axis=1) * (down / up)
+            self._resampled[fs] = RIR(fs, rir_array, self._mic_names, self._spk_name,
+                                      "{}_fs_{:d}".format(self._name, int(fs)))
+        return self._resampled[fs]
+
+    def _get_spectrum(self):
+        """
+        Returns (nfft, spectrum) of RIR for the overlap-add convolution, computed only once
+        """
+        if self._spectrum is None:
+            self._nfft = 1 << int(4 * self._n_sample - 1).bit_length()
+            self._spectrum = np.fft.rfft(self._rir_array, self._nfft, axis=1)
+        return self._nfft, self._spectrum
+
+    def apply2audio1D(self, audio1d, fs=None):
         """
         Returns the reverb audio for each mirophone
         Args:
             audio1d: 1d numpy float array
+            fs     : integer Sampling rate of audio1d, optional (default: the sampling rate of RIR)
         """
+        if fs is not None and fs != self._fs:
+            return self.resample(fs).apply2audio1D(audio1d)
         length = audio1d.shape[0]
-        ans = np.empty((self._n_mic, length))
-        for i in range(self._n_mic):
-            ans[i] = np.convolve(self._rir_array[i, :], audio1d, mode='same') 
-        return ans
+        nfft, spectrum = self._get_spectrum()
+        block = nfft - self._n_sample + 1
+        full = np.zeros((self._n_mic, length + self._n_sample - 1))
+        # overlap-add convolution with the cached spectrum
+        for start in range(0, length, block):
+            segment = audio1d[start:start + block]
+            n_out = segment.shape[0] + self._n_sample - 1
+            out = np.fft.irfft(spectrum * np.fft.rfft(segment, nfft), nfft, axis=1)
+            full[:, start:start + n_out] += out[:, :n_out]
+        # keep the centered part as np.convolve(..., mode='same')
+        offset = (min(length, self._n_sample) - 1) // 2
+        return full[:, offset:offset + length]
 
     def apply2audio_file(self, filepath):
         """
         Returns A list of numpy array, the length of the list is the number of auio channels
+            The RIR is resampled to the sampling rate of the audio file if needed
+        Args:
+            filepath: the audio filepath, supporting .WAV format only
+        """
+        _, arr_list = self._apply2audio_file(filepath)
+        return arr_list
+
+    def _apply2audio_file(self, filepath):
+        """
+        Returns (fs, list of numpy array), fs is the sampling rate of the audio file
         Args:
             filepath: the audio filepath, supporting .WAV format only
         """
         fs, data = wavfile.read(filepath)
-        if fs != self._fs:
-            raise RuntimeError("The Sampling Rate of the Audio File is not compatible with the RIR.")
+        rir_obj = self.resample(fs)
         if len(data.shape) == 1:
             n_channel = 1
         elif len(data.shape) == 2:
@@ -95,13 +153,13 @@ class RIR:
         if not np.issubdtype(data.dtype, np.floating):
             data = data.astype(np.float32) / np.iinfo(data.dtype).max 
         if n_channel == 1:
-            return [self.apply2audio1D(data)]
-        return [self.apply2audio1D(data[:,i]) for i in range(n_channel)]
+            return fs, [rir_obj.apply2audio1D(data)]
+        return fs, [rir_obj.apply2audio1D(data[:,i]) for i in range(n_channel)]
 
     def apply2audio_folder(self, audio_folder):
         """
         Returns None but writing reverb audio files with float32 format
-            Supporting WAV format only for now
+            Supporting WAV format only for now, the files may have different sampling rates
         Args:
            audio_foler: the clean audio folder
         """
@@ -110,15 +168,108 @@ class RIR:
         os.makedirs(out_folder, exist_ok=True)
         for k,filename in enumerate(files):
             path = os.path.join(audio_folder, filename)
-            arr_list = self.apply2audio_file(path)
+            fs, arr_list = self._apply2audio_file(path)
             fname = ".".join(filename.split('.')[:-1])
             for i, arr in enumerate(arr_list):
                 reverb_fname = fname + "_ch{:d}_Reverb.wav".format(i)
                 arr32 = arr.astype(np.float32)
-                wavfile.write(os.path.join(out_folder, reverb_fname), self._fs, arr32.T)
+                wavfile.write(os.path.join(out_folder, reverb_fname), fs, arr32.T)
             print('Writing {:.2f}%.'.format( (k+1.0) / len(files)))
         
 
+class BFormatRIR:
+    """
+    class for First Order Ambisonic (B-Format) RIR
+        Each Microphone Position holds 4 components: W (omni), X, Y and Z (dipoles along the axes).
+        Omni, Dipole, Cardioid, Subcardioid and Hypercardioid RIRs at these positions
+        with any orientation are linear combinations of the 4 components.
+    Args:
+        fs             : integer Sampling rate
+        bformat_array  : numpy array (n_position, 4, length of RIR)
+        positions      : list or tuple of (x,y,z)
+        speaker_name   : str
+        name           : str
+    """
+    _bformat_id = 0
+    def __init__(self, fs, bformat_array, positions, speaker_name, name=None):
+        """
+        Args:
+            fs             : integer Sampling rate
+            bformat_array  : numpy array (n_position, 4, length of RIR)
+            positions      : list or tuple of (x,y,z)
+            speaker_name   : str
+            name           : str
+        """
+        if len(bformat_array.shape) != 3 or bformat_array.shape[1] != 4:
+            raise ValueError('The shape of B-Format Numpy Array should be (n_position, 4, n_sample)')
+        if len(positions) != bformat_array.shape[0]:
+            raise ValueError('The number of positions is not compatible with the B-Format Numpy Array.')
+        self._bformat_array = bformat_array
+        self._fs = fs
+        self._n_pos, _, self._n_sample = bformat_array.shape
+        self._pos_index = {tuple(pos): i for i, pos in enumerate(positions)}
+        if not name:
+            self._name = "BFormatRIR_{:d}_nPos_{:d}_nSample_{:d}".format(
+                self._bformat_id, self._n_pos, self._n_sample)
+        else:
+            self._name = name
+        self._bformat_id += 1
+        self._spk_name = speaker_name
+
+    def __str__(self):
+        return self._name
+
+    def get_numpy(self):
+        """
+        Returns numpy array (n_position, 4, length of RIR) of W, X, Y, Z components
+        """
+        return self._bformat_array.copy()
+
+    def steer(self, mic_or_mics, name=None):
+        """
+        Returns RIR object whose channels are synthesised from the B-Format components
+        Args:
+            mic_or_mics: Microphone object or list of Microphones,
+                         located at positions of the B-Format RIR
+            name       : str, optional
+        """
+        if isinstance(mic_or_mics, Microphone):
+            mics = (mic_or_mics,)
+        elif isinstance(mic_or_mics, list) or isinstance(mic_or_mics, tuple):
+            mics = tuple(mic_or_mics)
+            if any([not isinstance(mic, Microphone) for mic in mics]):
+                raise ValueError('Some Objects are not Microphone Objects')
+        else:
+            raise ValueError('The mic_or_mics value should be Microphone object or list of Microphone Objects')
+        if any([mic.get_pos() not in self._pos_index for mic in mics]):
+            raise ValueError('Some Microphone Positions are not computed in the B-Format RIR')
+        rir_numpy_mics = np.empty((len(mics), self._n_sample), dtype=np.float64)
+        for i, mic in enumerate(mics):
+            if isinstance(mic, Dipole):
+                omni_weight = 0.0
+            elif isinstance(mic, Subcardioid):
+                omni_weight = 0.75
+            elif isinstance(mic, Cardioid):
+                omni_weight = 0.5
+            elif isinstance(mic, Hypercardioid):
+                omni_weight = 0.25
+            else: # Omni
+                omni_weight = 1.0
+            weights = np.zeros((4,), dtype=np.float64)
+            weights[0] = omni_weight
+            if omni_weight < 1.0:
+                mic_azimuth, mic_elevation = mic.get_orient()
+                mic_azimuth   = mic_azimuth / 180.0 * np.pi
+                mic_elevation = mic_elevation / 180.0 * np.pi
+                weights[1:] = (1.0 - omni_weight) * np.array([
+                    np.cos(mic_elevation) * np.cos(mic_azimuth),
+                    np.cos(mic_elevation) * np.sin(mic_azimuth),
+                    np.sin(mic_elevation)])
+            rir_numpy_mics[i] = weights.dot(self._bformat_array[self._pos_index[mic.get_pos()]])
+        mic_names = tuple(str(mic) for mic in mics)
+        return RIR(self._fs, rir_numpy_mics, mic_names, self._spk_name, name)
+
+
 class Field:
     """
     class for Sound (Acoustic) Field 
@@ -149,11 +300,11 @@ class Field:
         self._field_id += 1
         self._high_pass = high_pass
     
-    def compute_rir(self, room):
+    def _beta_array(self, room):
         """
+        Returns numpy array of the wall reflection coefficients of room
         Args:
-            room: Room Object with Microphoena and Speaker
-        Returns tuple of RIR objects
+            room: ReflectRoom or ReverbRoom Object
         """
         # beta array
         if isinstance(room, ReflectRoom):
@@ -169,7 +320,15 @@ class Field:
                 raise ValueError("The Room Size makes the wall reflection coefficients invalid.")
             beta0 = np.sqrt(1.0-alpha)
             beta = tuple(beta0 for _ in range(6))
-        beta = np.array(beta, dtype=np.float64)
+        return np.array(beta, dtype=np.float64)
+
+    def compute_rir(self, room):
+        """
+        Args:
+            room: Room Object with Microphoena and Speaker
+        Returns tuple of RIR objects
+        """
+        beta = self._beta_array(room)
 
         comb = room.mic_speaker_combination()
         n_mic = len(comb[0][0])
@@ -217,5 +376,42 @@ class Field:
             rirobj_list.append(RIR(self._fs, rir_numpy_mics, tuple(mic_names), str(spk)))
         return tuple(rirobj_list)
     
+    def compute_bformat(self, room):
+        """
+        Computes the W, X, Y, Z components for each Microphone Position in a single image pass,
+            the beam patterns and orientations of the Microphones are ignored here
+            and can be chosen afterwards with BFormatRIR.steer
+        Args:
+            room: Room Object with Microphoena and Speaker
+        Returns tuple of BFormatRIR objects
+        """
+        beta = self._beta_array(room)
+
+        comb = room.mic_speaker_combination()
+        room_size = np.array(room.get_size(), dtype=np.float64)
+        positions = []
+        for mic in comb[0][0]:
+            if mic.get_pos() not in positions:
+                positions.append(mic.get_pos())
+        bformat_list = []
+        for _, spk in comb:
+            src_pos = np.array(spk.get_pos(),  dtype=np.float64)
+            bformat_numpy = np.empty((len(positions), 4, self._n_sample), dtype=np.float64)
+            for i, pos in enumerate(positions):
+                mic_pos = np.array(pos, dtype=np.float64)
+                bformat_numpy[i] = rir_bformat(
+                    self._sound_speed,
+                    self._fs,
+                    room_size,
+                    mic_pos,
+                    src_pos,
+                    beta,
+                    self._n_sample,
+                    self._high_pass,
+                    room.get_reflect_order()
+                )
+            bformat_list.append(BFormatRIR(self._fs, bformat_numpy, tuple(positions), str(spk)))
+        return tuple(bformat_list)
+    
     def __str__(self):
         return self._name
\ No newline at end of file
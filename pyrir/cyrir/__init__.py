@@ -6,5 +6,5 @@ author: github.com/ludlows
 
 This program is designed with the hope that it will be useful, but WITHOUT ANY GUARANTEE.
 '''
-# expose the rir function
-from .cyrir import rir
+# expose the rir functions
+from .cyrir import rir, rir_bformat
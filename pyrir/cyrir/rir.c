@@ -90,6 +90,27 @@ double hypercardioid(double x, double y, double z, double angle1, double angle2)
 }
 
 
+// 100 Hz High Pass Filter applied in place to an impulse response of length impulse_len
+void high_pass_filter(double * impulse, int impulse_len, double fs) {
+	const double W = 2 * M_PI * 100 / fs; // The cut-off frequency equals 100 Hz
+	const double R1 = exp(-W);
+	const double B1 = 2 * R1*cos(W);
+	const double B2 = -R1 * R1;
+	const double A1 = -(1 + R1);
+	double       X0;
+	double       Y[3];
+	for (int idx = 0; idx < 3; idx++) { Y[idx] = 0; }
+	for (int idx = 0; idx < impulse_len; idx++)
+	{
+		X0 = impulse[idx];
+		Y[2] = Y[1];
+		Y[1] = Y[0];
+		Y[0] = B1 * Y[1] + B2 * Y[2] + X0;
+		impulse[idx] = Y[0] + A1 * Y[1] + R1 * Y[2];
+	}
+}
+
+
 // Computing the Room Impulse Response for Mic (mic_x, mic_y, mic_z) and Source (src_x, src_y, src_z)
 void comp_rir(double sound_speed, double fs, 
 	          double size_x, double size_y, double size_z, // room size
@@ -208,26 +229,129 @@ void comp_rir(double sound_speed, double fs,
 
 	// high pass filter
 	if (high_pass) {
+		high_pass_filter(impulse, impulse_len, fs);
+	}
+
+	free(LPI);
+	LPI = NULL;
+	
+}
+
+// Computing the First Order Ambisonic (B-Format) Room Impulse Response for Mic (mic_x, mic_y, mic_z) and Source (src_x, src_y, src_z)
+// impulse holds 4 channels of length impulse_len one after another: W (omni), X, Y and Z (dipoles along the axes)
+// every 1st order beam pattern a + (1 - a) * cos(theta) is a linear combination of these 4 channels
+void comp_rir_bformat(double sound_speed, double fs, 
+	          double size_x, double size_y, double size_z, // room size
+	          double  mic_x, double  mic_y, double  mic_z, // mic position
+	          double  src_x, double  src_y, double  src_z, // sound source position
+	          double * beta_arr,                           // wall reflation coefficients length 6
+	          double * impulse, int impulse_len,           // impulse response (4 * impulse_len) and its length
+              int     high_pass,                           // using high pass filter or not
+	          int     reflect_order                        // reflection order
+	) {
+
+	// image method
+	// Temporary variables and constants (image-method)
+	const double Fc = 1; // The cut-off frequency equals fs/2 - Fc is the normalized cut-off frequency.
+	const int    Tw = 2 * ROUND(0.004*fs); // The width of the low-pass FIR equals 8 ms
+	const double cTs = sound_speed / fs;
+	double *     LPI = (double *) malloc(sizeof(double) * Tw);
+	double *     chan[4];
+	double       r [3];
+	double       s [3];
+	double       L [3];
+	double       Rm[3];
+	double       Rp_plus_Rm[3];
+	double       refl[3];
+	double       fdist, dist;
+	double       gain;
+	double       axis_gain[4];
+	int          startPosition;
+	int          n1, n2, n3;
+	int          q, j, k;
+	int          mx, my, mz;
+	int          n, c;
+
+	for (c = 0; c < 4; c++) { chan[c] = impulse + c * impulse_len; }
 
-		const double W = 2 * M_PI * 100 / fs; // The cut-off frequency equals 100 Hz
-		const double R1 = exp(-W);
-		const double B1 = 2 * R1*cos(W);
-		const double B2 = -R1 * R1;
-		const double A1 = -(1 + R1);
-		double       X0;
-		double       Y[3];
-		for (int idx = 0; idx < 3; idx++) { Y[idx] = 0; }
-		for (int idx = 0; idx < impulse_len; idx++)
+	s[0] = src_x / cTs; s[1] = src_y / cTs; s[2] = src_z / cTs;
+	L[0] = size_x / cTs; L[1] = size_y / cTs; L[2] = size_z / cTs;
+
+	r[0] = mic_x / cTs;
+	r[1] = mic_y / cTs;
+	r[2] = mic_z / cTs;
+
+	n1 = (int)ceil(impulse_len / (2 * L[0]));
+	n2 = (int)ceil(impulse_len / (2 * L[1]));
+	n3 = (int)ceil(impulse_len / (2 * L[2]));
+
+	// Generate room impulse response
+	for (mx = -n1; mx <= n1; mx++)
+	{
+		Rm[0] = 2 * mx*L[0];
+
+		for (my = -n2; my <= n2; my++)
 		{
-			X0 = impulse[idx];
-			Y[2] = Y[1];
-			Y[1] = Y[0];
-			Y[0] = B1 * Y[1] + B2 * Y[2] + X0;
-			impulse[idx] = Y[0] + A1 * Y[1] + R1 * Y[2];
+			Rm[1] = 2 * my*L[1];
+
+			for (mz = -n3; mz <= n3; mz++)
+			{
+				Rm[2] = 2 * mz*L[2];
+
+				for (q = 0; q <= 1; q++)
+				{
+					Rp_plus_Rm[0] = (1 - 2 * q)*s[0] - r[0] + Rm[0];
+					refl[0] = pow(beta_arr[0], abs(mx - q)) * pow(beta_arr[1], abs(mx));
+
+					for (j = 0; j <= 1; j++)
+					{
+						Rp_plus_Rm[1] = (1 - 2 * j)*s[1] - r[1] + Rm[1];
+						refl[1] = pow(beta_arr[2], abs(my - j)) * pow(beta_arr[3], abs(my));
+
+						for (k = 0; k <= 1; k++)
+						{
+							Rp_plus_Rm[2] = (1 - 2 * k)*s[2] - r[2] + Rm[2];
+							refl[2] = pow(beta_arr[4], abs(mz - k)) * pow(beta_arr[5], abs(mz));
+
+							dist = sqrt(pow(Rp_plus_Rm[0], 2) + pow(Rp_plus_Rm[1], 2) + pow(Rp_plus_Rm[2], 2));
+
+							if (abs(2 * mx - q) + abs(2 * my - j) + abs(2 * mz - k) <= reflect_order || reflect_order == -1)
+							{
+								fdist = floor(dist);
+								if (fdist < impulse_len)
+								{
+									gain = refl[0] * refl[1] * refl[2] / (4 * M_PI*dist*cTs);
+									// W is the omni gain, X Y Z are the direction cosines of the image
+									axis_gain[0] = gain;
+									axis_gain[1] = gain * Rp_plus_Rm[0] / dist;
+									axis_gain[2] = gain * Rp_plus_Rm[1] / dist;
+									axis_gain[3] = gain * Rp_plus_Rm[2] / dist;
+
+									for (n = 0; n < Tw; n++) {
+										LPI[n] = 0.5 * (1 - cos(2 * M_PI*((n + 1 - (dist - fdist)) / Tw))) * Fc * sinc(M_PI * Fc * (n + 1 - (dist - fdist) - (0.5 * Tw)));
+									}
+									startPosition = (int)fdist - (Tw / 2) + 1;
+									for (n = 0; n < Tw; n++)
+										if (startPosition + n >= 0 && startPosition + n < impulse_len)
+											for (c = 0; c < 4; c++)
+												chan[c][(startPosition + n)] += axis_gain[c] * LPI[n];
+								}
+							}
+						}
+					}
+				}
+			}
+		}
+	}
+
+	// high pass filter
+	if (high_pass) {
+		for (c = 0; c < 4; c++) {
+			high_pass_filter(chan[c], impulse_len, fs);
 		}
 	}
 
 	free(LPI);
 	LPI = NULL;
 	
-}
\ No newline at end of file
+}